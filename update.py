@@ -2,20 +2,44 @@ import os
 import re
 import json
 import csv
+import hashlib
+import io
+import xml.etree.ElementTree as ET
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timezone
+from html.parser import HTMLParser
 
 import requests
+from requests.adapters import HTTPAdapter
 import feedparser
 
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
 USER_AGENT = os.getenv("SEC_USER_AGENT", "Leonard Klauss leonard@example.com")
 
 SEC_RSS_URL = "https://www.sec.gov/cgi-bin/browse-edgar?action=getcurrent&output=atom"
 SEC_FORMS = {"SC 13D", "SC 13G", "8-K"}
+ATOM_NS = "{http://www.w3.org/2005/Atom}"
 
 DE_NEWS_RSS = "https://api.boerse-frankfurt.de/v1/feeds/news.rss"
+DE_FETCH_WORKERS = 16
 
 MAX_EVENTS = 2000
 
+SESSION = requests.Session()
+SESSION.headers.update({"User-Agent": USER_AGENT, "Accept-Encoding": "gzip, deflate"})
+SESSION.mount("https://", HTTPAdapter(pool_connections=32, pool_maxsize=32))
+
+_SPACE_NL_RE = re.compile(r"\s+\n")
+_MULTI_NL_RE = re.compile(r"\n{3,}")
+_ISSUER_RE = re.compile(r"Stimmrechte\s*:\s*(.+?)(?:\s+-\s+|\s+\||$)")
+_PERCENT_RE = re.compile(r"(\d+(?:[.,]\d+)?)\s*%")
+_JUR_PERSON_RE = re.compile(r"Juristische Person\s*:\s*(.+)")
+_NAT_PERSON_RE = re.compile(r"Natürliche Person\s*:\s*(.+)")
+
 
 def now_utc_iso():
     return datetime.now(timezone.utc).isoformat()
@@ -25,6 +49,9 @@ def load_json(path, default):
     if not os.path.exists(path):
         return default
     try:
+        if orjson is not None:
+            with open(path, "rb") as f:
+                return orjson.loads(f.read())
         with open(path, "r", encoding="utf-8") as f:
             return json.load(f)
     except Exception:
@@ -32,47 +59,125 @@ def load_json(path, default):
 
 
 def save_json(path, data):
+    if orjson is not None:
+        with open(path, "wb") as f:
+            f.write(orjson.dumps(data, option=orjson.OPT_INDENT_2 | orjson.OPT_NON_STR_KEYS))
+        return
     with open(path, "w", encoding="utf-8") as f:
-        json.dump(data, f, ensure_ascii=False, indent=2)
+        f.write(json.dumps(data, ensure_ascii=False, indent=2))
+
+
+def load_seen(path):
+    if not os.path.exists(path):
+        return set()
+    with open(path, "r", encoding="utf-8") as f:
+        return {line for line in f.read().split("\n") if line}
+
+
+def append_seen(path, keys):
+    # Append-only: pro Lauf nur die neuen Schlüssel anhängen, eine Zeile je Schlüssel
+    with open(path, "a", encoding="utf-8") as f:
+        f.write("".join(key + "\n" for key in keys))
 
 
 def save_csv(path, events):
     cols = ["time_utc", "region", "source", "event", "buyer", "target", "percent", "title", "link"]
-    with open(path, "w", newline="", encoding="utf-8") as f:
-        w = csv.DictWriter(f, fieldnames=cols)
-        w.writeheader()
-        for e in events:
-            w.writerow({k: e.get(k, "") for k in cols})
+    rows = [tuple(e.get(k, "") for k in cols) for e in events]
+    with open(path, "w", newline="", encoding="utf-8", buffering=1 << 20) as f:
+        w = csv.writer(f)
+        w.writerow(cols)
+        w.writerows(rows)
+
+
+def fetch_feed(url, cache):
+    # Conditional GET: liefert None, wenn sich der Feed seit dem letzten Lauf nicht geändert hat
+    headers = {}
+    cached = cache.get(url) or {}
+    if cached.get("etag"):
+        headers["If-None-Match"] = cached["etag"]
+    if cached.get("last_modified"):
+        headers["If-Modified-Since"] = cached["last_modified"]
+
+    r = SESSION.get(url, headers=headers, timeout=30)
+    if r.status_code == 304:
+        return None
+    r.raise_for_status()
+
+    entry = {
+        "etag": r.headers.get("ETag", ""),
+        "last_modified": r.headers.get("Last-Modified", "")
+    }
+    unchanged = False
+    if not entry["etag"] and not entry["last_modified"]:
+        # Server ohne ETag/Last-Modified: gleicher Inhalt wie beim letzten Lauf -> nicht erneut parsen
+        entry["sha256"] = hashlib.sha256(r.content).hexdigest()
+        unchanged = entry["sha256"] == cached.get("sha256")
+    cache[url] = entry
+    return None if unchanged else r
+
+
+def response_text(r):
+    # Einmal dekodieren; unbekannter Zeichensatz (z. B. "utf8mb3") -> UTF-8, wie requests' r.text
+    try:
+        return r.content.decode(r.encoding or "utf-8", "replace")
+    except (LookupError, TypeError):
+        return r.content.decode("utf-8", "replace")
 
 
 def extract_sec_form(title):
-    m = re.match(r"^([A-Z0-9/\- ]+?)\s+-\s+", (title or "").strip())
-    return m.group(1).strip() if m else ""
+    head = (title or "").strip().split(" - ", 1)[0].strip()
+    return head if head in SEC_FORMS else ""
+
+
+class _Stripper(HTMLParser):
+    # Ein Durchlauf über das HTML: Text sammeln, <br> und </p> als Zeilenumbruch,
+    # alle anderen Tags als Leerzeichen, Inhalt von <script>/<style> verwerfen.
+    def __init__(self):
+        super().__init__()
+        self._parts = []
+        self._skip = 0
+
+    def handle_starttag(self, tag, attrs):
+        if tag in ("script", "style"):
+            self._skip += 1
+        self._parts.append("\n" if tag == "br" else " ")
+
+    def handle_endtag(self, tag):
+        if tag in ("script", "style") and self._skip:
+            self._skip -= 1
+        self._parts.append("\n" if tag == "p" else " ")
+
+    def handle_data(self, data):
+        if not self._skip:
+            self._parts.append(data.replace("\xa0", " "))
+
+    def getvalue(self):
+        return "".join(self._parts)
 
 
 def html_to_text(html):
-    txt = re.sub(r"<(script|style)[^>]*>.*?</\1>", " ", html, flags=re.I | re.S)
-    txt = re.sub(r"<br\s*/?>", "\n", txt, flags=re.I)
-    txt = re.sub(r"</p\s*>", "\n", txt, flags=re.I)
-    txt = re.sub(r"<[^>]+>", " ", txt)
-    txt = re.sub(r"&nbsp;", " ", txt)
-    txt = re.sub(r"\s+\n", "\n", txt)
-    txt = re.sub(r"\n{3,}", "\n\n", txt)
+    p = _Stripper()
+    p.feed(html)
+    p.close()
+    txt = _SPACE_NL_RE.sub("\n", p.getvalue())
+    txt = _MULTI_NL_RE.sub("\n\n", txt)
     return txt.strip()
 
 
 def de_extract_issuer_from_title(title):
     t = title or ""
-    m = re.search(r"Stimmrechte\s*:\s*(.+?)(?:\s+-\s+|\s+\||$)", t)
+    m = _ISSUER_RE.search(t)
     return (m.group(1).strip() if m else "").strip()
 
 
 def de_parse_percent_new(text):
     # Nimmt aus der Zeile "neu ..." die letzte Prozentzahl
     for line in text.splitlines():
-        l = line.strip().lower()
-        if l.startswith("neu "):
-            perc = re.findall(r"(\d+(?:[.,]\d+)?)\s*%", line)
+        if "%" not in line:
+            continue
+        # nur den Zeilenanfang prüfen statt die ganze Zeile zu kopieren
+        if line.lstrip()[:4].lower() == "neu ":
+            perc = _PERCENT_RE.findall(line)
             if perc:
                 s = perc[-1].replace(",", ".")
                 try:
@@ -83,50 +188,63 @@ def de_parse_percent_new(text):
 
 
 def de_parse_notifier(text):
-    m = re.search(r"Juristische Person\s*:\s*(.+)", text)
+    m = _JUR_PERSON_RE.search(text)
     if m:
         return m.group(1).strip()
-    m = re.search(r"Natürliche Person\s*:\s*(.+)", text)
+    m = _NAT_PERSON_RE.search(text)
     if m:
         return m.group(1).strip()
     return ""
 
 
-def collect_sec():
-    headers = {"User-Agent": USER_AGENT, "Accept-Encoding": "gzip, deflate"}
-    r = requests.get(SEC_RSS_URL, headers=headers, timeout=30)
-    r.raise_for_status()
-    feed = feedparser.parse(r.text)
-
+def collect_sec(cache):
+    r = fetch_feed(SEC_RSS_URL, cache)
+    if r is None:
+        return []
+    # Atom-Feed streamend lesen, nur title/link werden gebraucht
+    ts = now_utc_iso()
     out = []
-    for entry in feed.entries:
-        title = (getattr(entry, "title", "") or "").strip()
-        link = (getattr(entry, "link", "") or "").strip()
-        form = extract_sec_form(title)
-        if form not in SEC_FORMS:
-            continue
-
-        out.append({
-            "time_utc": now_utc_iso(),
-            "region": "US",
-            "source": "SEC",
-            "event": form,
-            "buyer": "",
-            "target": "",
-            "percent": "",
-            "title": title,
-            "link": link
-        })
+    root = None
+    try:
+        for event, elem in ET.iterparse(io.BytesIO(r.content), events=("start", "end")):
+            if root is None:
+                root = elem
+            if event != "end" or elem.tag != ATOM_NS + "entry":
+                continue
+            title = (elem.findtext(ATOM_NS + "title") or "").strip()
+            link_elem = elem.find(ATOM_NS + "link")
+            link = (link_elem.get("href", "") if link_elem is not None else "").strip()
+            # Verarbeitete Einträge aus dem Baum lösen, damit der Speicher flach bleibt
+            root.clear()
+
+            form = extract_sec_form(title)
+            if form not in SEC_FORMS:
+                continue
+
+            out.append({
+                "time_utc": ts,
+                "region": "US",
+                "source": "SEC",
+                "event": form,
+                "buyer": "",
+                "target": "",
+                "percent": "",
+                "title": title,
+                "link": link
+            })
+    except ET.ParseError:
+        # Kein gültiges XML (z. B. HTML-Fehlerseite): wie zuvor feedparser keine Einträge
+        return []
     return out
 
 
-def collect_de():
-    headers = {"User-Agent": USER_AGENT, "Accept-Encoding": "gzip, deflate"}
-    r = requests.get(DE_NEWS_RSS, headers=headers, timeout=30)
-    r.raise_for_status()
-    feed = feedparser.parse(r.text)
+def collect_de(cache):
+    r = fetch_feed(DE_NEWS_RSS, cache)
+    if r is None:
+        return []
+    feed = feedparser.parse(r.content)
 
-    out = []
+    candidates = []
     for entry in feed.entries[:120]:
         title = (getattr(entry, "title", "") or "").strip()
         link = (getattr(entry, "link", "") or "").strip()
@@ -135,57 +253,66 @@ def collect_de():
             continue
         if ("Stimmrechte" not in title) and ("Stimmrechtsmitteilung" not in title):
             continue
-
-        issuer = de_extract_issuer_from_title(title)
-
-        # Best effort: Artikel laden, wenn möglich
-        notifier = ""
-        percent_new = ""
-        rr = requests.get(link, headers={"User-Agent": USER_AGENT}, timeout=30)
-        if rr.ok:
-            text = html_to_text(rr.text)
-            pn = de_parse_percent_new(text)
-            if pn is not None:
-                percent_new = str(pn)
-            notifier = de_parse_notifier(text)
-
-        out.append({
-            "time_utc": now_utc_iso(),
-            "region": "DE",
-            "source": "DeutscheBoerseRSS",
-            "event": "Stimmrechte",
-            "buyer": notifier,
-            "target": issuer,
-            "percent": percent_new,
-            "title": title,
-            "link": link
-        })
+        candidates.append((title, link))
+
+    # Best effort: Artikel parallel laden, wenn möglich
+    with ThreadPoolExecutor(max_workers=DE_FETCH_WORKERS) as pool:
+        responses = pool.map(lambda c: SESSION.get(c[1], timeout=30), candidates)
+
+        ts = now_utc_iso()
+        out = []
+        for (title, link), rr in zip(candidates, responses):
+            issuer = de_extract_issuer_from_title(title)
+
+            notifier = ""
+            percent_new = ""
+            if rr.ok:
+                text = html_to_text(response_text(rr))
+                pn = de_parse_percent_new(text)
+                if pn is not None:
+                    percent_new = str(pn)
+                notifier = de_parse_notifier(text)
+
+            out.append({
+                "time_utc": ts,
+                "region": "DE",
+                "source": "DeutscheBoerseRSS",
+                "event": "Stimmrechte",
+                "buyer": notifier,
+                "target": issuer,
+                "percent": percent_new,
+                "title": title,
+                "link": link
+            })
 
     return out
 
 
 def main():
-    seen = set(load_json("seen.json", []))
+    seen = load_seen("seen.log")
     events = load_json("data.json", [])
+    feeds = load_json("feeds.json", {})
 
     new_items = []
-    items = collect_sec() + collect_de()
-
-    for item in items:
-        key = item.get("link") or item.get("title")
-        if not key or key in seen:
-            continue
-        seen.add(key)
-        new_items.append(item)
-
+    items = collect_sec(feeds) + collect_de(feeds)
+
+    keys = [item.get("link") or item.get("title") for item in items]
+    fresh = {key for key in keys if key} - seen
+    new_keys = []
+    for key, item in zip(keys, items):
+        # discard: doppelte Einträge innerhalb eines Laufs nur einmal übernehmen
+        if key in fresh:
+            fresh.discard(key)
+            new_keys.append(key)
+            new_items.append(item)
+
+    # Ohne neue Einträge bleiben seen.log, data.json und events.csv unverändert
     if new_items:
-        events = new_items + events
-
-    events = events[:MAX_EVENTS]
-
-    save_json("seen.json", sorted(list(seen)))
-    save_json("data.json", events)
-    save_csv("events.csv", events)
+        events = (new_items + events)[:MAX_EVENTS]
+        append_seen("seen.log", new_keys)
+        save_json("data.json", events)
+        save_csv("events.csv", events)
+    save_json("feeds.json", feeds)
 
     print(f"Done. New: {len(new_items)} | Total: {len(events)}")
 